@@ -0,0 +1,4 @@
+"""
+Toggl → (CSV) → Google Drive（Googleスプレッドシート）への保存処理。
+実体は toggl_drive.core にあり、エントリポイントは main.py。
+"""
@@ -0,0 +1,859 @@
+"""
+Toggl → (CSV) → Google Drive に「Googleスプレッドシート」として保存するスクリプト。
+
+- 最新版：toggl_time_entries_latest（毎回上書き）
+- 日付版：toggl_time_entries_YYYY-MM-DD（任意で毎回作成）
+
+必要な環境変数（GitHub Secrets推奨）
+- TOGGL_API_TOKEN        : Toggl API token
+- TOGGL_WORKSPACE_ID     : Toggl workspace id
+- GOOGLE_DRIVE_TOKEN     : creds.to_json() の全文（OAuthで取得したトークンJSON）
+- DRIVE_FOLDER_ID        : （任意）保存先フォルダID（マイドライブ内フォルダ推奨）
+- START_DATE             : （任意）YYYY-MM-DD
+- END_DATE               : （任意）YYYY-MM-DD
+- DAYS                   : （任意）START/END未指定の場合の過去日数（例：90）
+- WRITE_DAILY_COPY        : （任意）"true"で日付版も作成（デフォルトtrue）
+- TARGET_FORMAT          : （任意）"sheet"（デフォルト）でGoogleスプレッドシートに変換、
+                           "csv"で変換せずCSVのまま保存（新規作成時のみ効く）
+- CREDS_CACHE_PATH       : （任意）refresh 後のトークンJSONを保存するパス（例：/tmp/.toggl_creds.json）
+                           有効期限まで5分以上残っていれば次回はこれを使い、refresh を省略する
+- DAILY_RETENTION_DAYS   : （任意）指定日数より古い日付版をゴミ箱へ移動（未指定・0なら削除しない）
+"""
+
+import os
+import re
+import json
+import hashlib
+import functools
+import tempfile
+import threading
+import time
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import IO, TYPE_CHECKING, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# google-auth / googleapiclient は import が重いので、Drive を使う関数の中で import する
+# （Toggl の取得をその分早く始められる）
+if TYPE_CHECKING:
+    import httpx
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2.credentials import Credentials
+
+GOOGLE_SHEETS_MIME = "application/vnd.google-apps.spreadsheet"
+CSV_MIME = "text/csv"
+# TARGET_FORMAT → 作成するファイルの mimeType（CSV_MIME ならサーバ側の変換なし）
+TARGET_MIMES = {"sheet": GOOGLE_SHEETS_MIME, "csv": CSV_MIME}
+# Google Sheets は md5Checksum を持たないので、アップロードしたCSVのmd5を appProperties に記録する
+CSV_MD5_PROPERTY = "csv_md5"
+# 作成したファイルには appProperties.role（toggl_latest / toggl_daily_YYYY-MM-DD）を付けて検索に使う
+ROLE_PROPERTY = "role"
+# role → file_id のローカルキャッシュ（ヒットすれば files.list の検索を省略して id で直接取得）
+ID_CACHE_PATH = os.path.expanduser("~/.cache/toggl_drive_ids.json")
+
+# Toggl CSV の受信：この大きさまではメモリ、超えたら一時ファイルに退避
+CSV_SPOOL_MAX_BYTES = 1 << 20
+CSV_READ_CHUNK_BYTES = 64 * 1024
+# Drive への resumable アップロードのチャンクサイズ（256 KiB の倍数である必要あり）
+UPLOAD_CHUNK_BYTES = 512 * 1024
+# チャンク送信が一時的なエラー（429/5xx・通信エラー）で失敗したときの再試行
+UPLOAD_MAX_RETRIES = 5
+UPLOAD_RETRY_BACKOFF_SECONDS = 0.5
+# 一時的なエラーとみなして再試行する HTTP ステータス
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# CREDS_CACHE_PATH のトークンを使うのに必要な残り有効期間
+CREDS_CACHE_MIN_REMAINING = dt.timedelta(minutes=5)
+
+LATEST_NAME = "toggl_time_entries_latest"
+DAILY_NAME_PREFIX = "toggl_time_entries_"
+DAILY_ROLE_PREFIX = "toggl_daily_"
+# 日付版の名前（toggl_time_entries_YYYY-MM-DD）。prune で消してよいかの判定に使う
+DAILY_NAME_RE = re.compile(re.escape(DAILY_NAME_PREFIX) + r"\d{4}-\d{2}-\d{2}")
+# 1回のバッチに入れるリクエスト数（Drive の推奨上限）
+DRIVE_BATCH_LIMIT = 100
+
+
+# ----------------------------
+# HTTP session (Toggl)
+# ----------------------------
+def _build_http_session() -> requests.Session:
+    """
+    接続を使い回す requests.Session。
+    リトライ時や複数リクエスト時に TCP/TLS ハンドシェイクをやり直さない。
+    """
+    retry = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        # Toggl の検索APIは POST だが冪等なのでリトライ対象に含める
+        allowed_methods=frozenset({"GET", "POST"}),
+        # リトライし尽くしたら最後のレスポンスを返し、raise_for_status() で Toggl のエラー内容を出す
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+    session.headers.update(
+        {
+            "Accept": CSV_MIME,
+            "Content-Type": "application/json",
+            # CSVはよく圧縮が効くので明示的に gzip を要求（r.content は requests が自動で展開）
+            "Accept-Encoding": "gzip, deflate",
+        }
+    )
+    return session
+
+
+_SESSION = _build_http_session()
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def require_env(name: str) -> str:
+    v = os.environ.get(name)
+    if not v:
+        raise RuntimeError(f"Missing required env var: {name}")
+    return v
+
+
+def env_bool(name: str, default: bool) -> bool:
+    v = os.environ.get(name)
+    if v is None:
+        return default
+    return v.strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def iso_date(d: dt.date) -> str:
+    return d.strftime("%Y-%m-%d")
+
+
+def resolve_date_range(today: dt.date) -> tuple[str, str]:
+    start = os.environ.get("START_DATE")
+    end = os.environ.get("END_DATE")
+    if start and end:
+        return start, end
+
+    days = int(os.environ.get("DAYS", "90"))
+    end_d = today
+    start_d = end_d - dt.timedelta(days=days)
+    return iso_date(start_d), iso_date(end_d)
+
+
+def resolve_target_mime() -> str:
+    fmt = os.environ.get("TARGET_FORMAT", "sheet").strip().lower()
+    if fmt not in TARGET_MIMES:
+        raise RuntimeError(f"Invalid TARGET_FORMAT: {fmt} (expected one of: {', '.join(TARGET_MIMES)})")
+    return TARGET_MIMES[fmt]
+
+
+def measure_file(fp: IO[bytes]) -> tuple[int, str]:
+    """
+    ファイル全体のサイズと md5 を返す（読み終わったら先頭に戻す）
+    """
+    fp.seek(0)
+    md5 = hashlib.md5()
+    size = 0
+    for chunk in iter(lambda: fp.read(CSV_READ_CHUNK_BYTES), b""):
+        md5.update(chunk)
+        size += len(chunk)
+    fp.seek(0)
+    return size, md5.hexdigest()
+
+
+class SharedReader:
+    """
+    1つのファイルを複数スレッドから読むためのラッパー。
+    読み位置はスレッドごとに持ち、seek+read は lock で直列化する。
+    （MediaIoBaseUpload は seek → read で読むので、そのまま共有すると位置が壊れる）
+    """
+
+    def __init__(self, fp: IO[bytes]):
+        self._fp = fp
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _pos(self) -> int:
+        return getattr(self._local, "pos", 0)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos() + offset
+        else:
+            with self._lock:
+                pos = self._fp.seek(offset, whence)
+        self._local.pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self._pos()
+
+    def read(self, size: int = -1) -> bytes:
+        with self._lock:
+            self._fp.seek(self._pos())
+            data = self._fp.read(size)
+        self._local.pos = self._pos() + len(data)
+        return data
+
+
+# ----------------------------
+# Toggl (Reports API v3) fetch
+# ----------------------------
+def fetch_toggl_csv(
+    workspace_id: str,
+    toggl_api_token: str,
+    start_date: str,
+    end_date: str,
+) -> IO[bytes]:
+    """
+    Toggl Reports API v3: time entries CSV
+    POST /reports/api/v3/workspace/{workspace_id}/search/time_entries.csv
+
+    GETだと 405 Method Not Allowed になりやすいので POST + JSON body で送ります。
+    レスポンスは全体をメモリに載せず SpooledTemporaryFile に流し込み、
+    先頭に seek した状態で返します（close は呼び出し側で）。
+    """
+    url = f"https://api.track.toggl.com/reports/api/v3/workspace/{workspace_id}/search/time_entries.csv"
+    payload = {"start_date": start_date, "end_date": end_date}
+    # 事前に bytes 化して Content-Length を固定（chunked 送信にならないように）
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+    csv_file = tempfile.SpooledTemporaryFile(max_size=CSV_SPOOL_MAX_BYTES)
+    with _SESSION.post(
+        url,
+        data=body,
+        headers={"Content-Length": str(len(body))},
+        auth=(toggl_api_token, "api_token"),
+        timeout=90,
+        stream=True,
+    ) as r:
+        r.raise_for_status()
+        for chunk in r.iter_content(CSV_READ_CHUNK_BYTES):
+            csv_file.write(chunk)
+    csv_file.seek(0)
+    return csv_file
+
+
+# ----------------------------
+# Google Drive (OAuth) service
+# ----------------------------
+def _load_cached_credentials(cache_path: str) -> Optional["Credentials"]:
+    from google.oauth2.credentials import Credentials
+
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            creds = Credentials.from_authorized_user_info(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+    # google-auth の expiry は naive な UTC
+    now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+    if creds.expiry is None or creds.expiry - now <= CREDS_CACHE_MIN_REMAINING:
+        return None
+    return creds
+
+
+def _save_cached_credentials(cache_path: str, creds: "Credentials") -> None:
+    # refresh_token を含むので本人だけが読めるように作る
+    try:
+        fd = os.open(cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(creds.to_json())
+    except OSError as e:
+        print(f"[WARN] Failed to write credentials cache: {e}")
+
+
+def get_drive_credentials_from_token_json(token_json_str: str) -> "Credentials":
+    """
+    token_json_str: creds.to_json() の全文（GOOGLE_DRIVE_TOKEN）
+
+    CREDS_CACHE_PATH が設定されていれば、前回 refresh したトークンがまだ有効な間は
+    そちらを使う（トークンエンドポイントへの refresh を省略）。
+    ただし client_id / refresh_token が token_json_str と違う場合（Secret の差し替えなど）は使わない。
+    """
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+
+    info = json.loads(token_json_str)
+
+    cache_path = os.environ.get("CREDS_CACHE_PATH")
+    if cache_path:
+        cached = _load_cached_credentials(cache_path)
+        if (
+            cached is not None
+            and cached.client_id == info.get("client_id")
+            and cached.refresh_token == info.get("refresh_token")
+        ):
+            return cached
+
+    creds = Credentials.from_authorized_user_info(info)
+
+    # 期限切れなら refresh_token で更新（refresh_tokenが無いと更新不可）
+    if creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+        if cache_path:
+            _save_cached_credentials(cache_path, creds)
+
+    return creds
+
+
+class _DriveHttp:
+    """
+    googleapiclient に渡す httplib2.Http 互換アダプタの共通部分（request() だけを実装する）。
+    サブクラスは _send()（認証付きで1回送信して (status, headers, content) を返す）だけを実装する。
+    """
+
+    def __init__(self, creds: "Credentials", timeout: int = 90):
+        self._creds = creds
+        self.timeout = timeout
+
+    @property
+    def credentials(self):
+        # バッチリクエストの各サブリクエストにも認証ヘッダを付けるために参照される
+        return self._creds
+
+    def _send(self, uri: str, method: str, body, headers: Optional[dict]):
+        raise NotImplementedError
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=None, connection_type=None):
+        import httplib2
+
+        # resumable アップロードのチャンクはストリームで渡されるので bytes にしてから送る
+        if hasattr(body, "read"):
+            body = body.read()
+        status, resp_headers, content = self._send(uri, method, body, headers)
+        info = dict(resp_headers)
+        info["status"] = str(status)
+        return httplib2.Response(info), content
+
+
+class _SessionHttp(_DriveHttp):
+    """
+    requests.Session（AuthorizedSession）で送るアダプタ。
+
+    - 接続プール（keep-alive）で TLS を使い回す
+    - requests.Session はスレッド間で共有できるので、Drive service を1つにできる
+    """
+
+    def __init__(self, session: "AuthorizedSession", timeout: int = 90):
+        super().__init__(session.credentials, timeout=timeout)
+        self._session = session
+
+    def _send(self, uri, method, body, headers):
+        r = self._session.request(
+            method,
+            uri,
+            data=body,
+            headers=headers,
+            timeout=self.timeout,
+            # 308（resumable の途中応答）などは googleapiclient 側で処理する
+            allow_redirects=False,
+        )
+        return r.status_code, r.headers, r.content
+
+
+class _Http2Http(_DriveHttp):
+    """
+    httpx（HTTP/2）で送るアダプタ。
+
+    - Drive への list / get / create / update / copy / batch を1本の TLS 接続上に多重化する
+    - httpx.Client はスレッド間で共有できるので、並列アップロードも同じ接続に乗る
+    - 認証は creds.token を Authorization: Bearer で付与（期限切れ・401 なら refresh）
+    """
+
+    def __init__(self, client: "httpx.Client", creds: "Credentials", timeout: int = 90):
+        super().__init__(creds, timeout=timeout)
+        self._client = client
+        self._refresh_lock = threading.Lock()
+
+    def _refresh(self, force: bool = False) -> None:
+        from google.auth.transport.requests import Request
+
+        with self._refresh_lock:
+            if force or not self._creds.valid:
+                self._creds.refresh(Request())
+
+    def _send_once(self, uri, method, body, headers):
+        headers = dict(headers or {})
+        self._creds.apply(headers)
+        return self._client.request(method, uri, content=body, headers=headers, timeout=self.timeout)
+
+    def _send(self, uri, method, body, headers):
+        self._refresh()
+        r = self._send_once(uri, method, body, headers)
+        if r.status_code == 401 and self._creds.refresh_token:
+            self._refresh(force=True)
+            r = self._send_once(uri, method, body, headers)
+        return r.status_code, r.headers, r.content
+
+
+def _build_drive_http(creds: "Credentials"):
+    """
+    googleapiclient に渡す http を作る。
+    httpx[http2] があれば HTTP/2（_Http2Http）、なければ requests の AuthorizedSession（_SessionHttp）。
+    """
+    try:
+        import httpx
+
+        # h2 が入っていないと http2=True で ImportError になる
+        # 308（resumable の途中応答）などは googleapiclient 側で処理するのでリダイレクトは追わない
+        client = httpx.Client(http2=True, follow_redirects=False)
+    except ImportError:
+        from google.auth.transport.requests import AuthorizedSession
+
+        print("[INFO] httpx[http2] is not installed; using HTTP/1.1 for Drive")
+        return _SessionHttp(AuthorizedSession(creds))
+    return _Http2Http(client, creds)
+
+
+def build_drive_service(creds: "Credentials"):
+    from googleapiclient.discovery import build
+
+    # discovery 経由の Resource は使うが、通信は _build_drive_http の接続（HTTP/2 or 接続プール）で行う
+    # discovery はライブラリ同梱のものを使い、取得・キャッシュ書き込みはしない
+    return build(
+        "drive",
+        "v3",
+        http=_build_drive_http(creds),
+        cache_discovery=False,
+        static_discovery=True,
+    )
+
+
+def get_drive_service_from_token_json(token_json_str: str):
+    """
+    token_json_str: creds.to_json() の全文（GOOGLE_DRIVE_TOKEN）
+    """
+    return build_drive_service(get_drive_credentials_from_token_json(token_json_str))
+
+
+# ----------------------------
+# Drive: Upsert CSV as Google Sheet
+# ----------------------------
+@functools.lru_cache(maxsize=16)
+def _scope_query(folder_id: Optional[str]) -> str:
+    # フォルダ指定がある場合はフォルダ内だけ検索
+    q_parts = ["trashed = false"]
+    if folder_id:
+        q_parts.append(f"'{folder_id}' in parents")
+    return " and ".join(q_parts)
+
+
+@functools.lru_cache(maxsize=256)
+def _build_role_query(role: str, name: str, folder_id: Optional[str]) -> str:
+    # role で検索。role 導入前に作った同名ファイルも拾えるよう name でも照合する
+    safe_name = name.replace("'", "\\'")
+    return (
+        f"(appProperties has {{ key='{ROLE_PROPERTY}' and value='{role}' }} or name = '{safe_name}')"
+        f" and {_scope_query(folder_id)}"
+    )
+
+
+def _id_cache_key(role: str, folder_id: Optional[str]) -> str:
+    return f"{folder_id or 'root'}:{role}"
+
+
+def load_id_cache() -> dict[str, str]:
+    # 読めない・壊れている（JSON でない、オブジェクトでない）場合はキャッシュなし扱い
+    try:
+        with open(ID_CACHE_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_file_ids(saved_ids: dict[str, str], folder_id: Optional[str]) -> None:
+    """
+    saved_ids: {role: file_id} をローカルキャッシュに書き込む（失敗しても処理は続行）
+    日付版の id は当日しか読まないので、今回保存したもの以外の toggl_daily_* は捨てる。
+    """
+    keep_keys = {_id_cache_key(role, folder_id) for role in saved_ids}
+    cache = {
+        key: file_id
+        for key, file_id in load_id_cache().items()
+        if key in keep_keys or not key.split(":", 1)[-1].startswith(DAILY_ROLE_PREFIX)
+    }
+    for role, file_id in saved_ids.items():
+        cache[_id_cache_key(role, folder_id)] = file_id
+    try:
+        os.makedirs(os.path.dirname(ID_CACHE_PATH), exist_ok=True)
+        with open(ID_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"[WARN] Failed to write Drive id cache: {e}")
+
+
+def find_files_by_roles(
+    drive_service,
+    targets: dict[str, str],
+    folder_id: Optional[str],
+) -> dict[str, Optional[dict]]:
+    """
+    targets: {role: name}
+    各 role のファイルを1回のバッチリクエストにまとめて検索する。
+    - キャッシュに id があれば files.get（id 指定なので検索より速い）
+    - なければ files.list（appProperties の role / name で検索）
+    戻り値: {role: file(id,name,webViewLink,appProperties) or None}
+    """
+    from googleapiclient.errors import HttpError
+
+    cache = load_id_cache()
+    found: dict[str, Optional[dict]] = {}
+
+    def _on_response(request_id, response, exception):
+        if exception is not None:
+            # キャッシュの id が削除済み → 見つからなかった扱い（新規作成される）
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                found[request_id] = None
+                return
+            raise exception
+        if "files" in response:
+            files = response["files"]
+            # 同名が複数あれば最初の1件（運用上は latest は1件に寄せるのが推奨）
+            found[request_id] = files[0] if files else None
+        else:
+            found[request_id] = None if response.get("trashed") else response
+
+    batch = drive_service.new_batch_http_request(callback=_on_response)
+    for role, name in targets.items():
+        cached_id = cache.get(_id_cache_key(role, folder_id))
+        if cached_id:
+            request = drive_service.files().get(
+                fileId=cached_id,
+                fields="id,name,webViewLink,appProperties,trashed",
+            )
+        else:
+            request = drive_service.files().list(
+                q=_build_role_query(role, name, folder_id),
+                spaces="drive",
+                fields="files(id,name,webViewLink,appProperties)",
+                pageSize=1,
+            )
+        batch.add(request, request_id=role)
+    batch.execute()
+    return found
+
+
+def _is_retryable_upload_error(e: Exception) -> bool:
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    if isinstance(e, HttpError):
+        return e.resp.status in RETRY_STATUSES
+
+    transport_errors = [
+        httplib2.HttpLib2Error,
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        ConnectionError,
+        TimeoutError,
+    ]
+    try:
+        import httpx
+
+        transport_errors.append(httpx.TransportError)
+    except ImportError:
+        pass
+    return isinstance(e, tuple(transport_errors))
+
+
+def _execute_resumable(request) -> dict:
+    """
+    resumable アップロードをチャンク単位で送信する。
+    チャンクが一時的なエラーで失敗したら待ってから next_chunk() を呼び直す。
+    （googleapiclient はエラー状態を覚えていて、次の呼び出しで Drive に受信済みの範囲を
+    問い合わせ、その位置から送信を再開する）
+    連続 UPLOAD_MAX_RETRIES 回失敗したらエラーをそのまま送出する。
+
+    next_chunk(num_retries=...) は使わない：同じチャンクのストリームを送り直すが、
+    アダプタが読み切った後なので空のボディになってしまう。
+    """
+    response = None
+    failures = 0
+    while response is None:
+        try:
+            _, response = request.next_chunk()
+        except Exception as e:
+            if failures >= UPLOAD_MAX_RETRIES or not _is_retryable_upload_error(e):
+                raise
+            failures += 1
+            wait = UPLOAD_RETRY_BACKOFF_SECONDS * 2 ** (failures - 1)
+            print(f"[WARN] Upload chunk failed ({e}); retry {failures}/{UPLOAD_MAX_RETRIES} in {wait:.1f}s")
+            time.sleep(wait)
+            continue
+        failures = 0
+    return response
+
+
+def build_csv_media(csv_file: IO[bytes]):
+    """
+    CSV を resumable アップロードする MediaIoBaseUpload を1つ作る。
+    MediaIoBaseUpload は読み位置を持たず毎回 seek してから読むので、
+    SharedReader で包んだファイルなら複数の upsert（スレッド）で同じものを共有できる。
+    """
+    from googleapiclient.http import MediaIoBaseUpload
+
+    return MediaIoBaseUpload(
+        csv_file,
+        mimetype=CSV_MIME,
+        chunksize=UPLOAD_CHUNK_BYTES,
+        resumable=True,
+    )
+
+
+def upsert_csv_as_google_sheet(
+    drive_service,
+    media,
+    csv_md5: str,
+    sheet_name: str,
+    role: str,
+    folder_id: Optional[str] = None,
+    existing: Optional[dict] = None,
+    target_mime: str = GOOGLE_SHEETS_MIME,
+) -> dict:
+    """
+    - existing（同じ role のファイル）があれば update（上書き）
+      ただし前回アップロードしたCSVと内容が同じならアップロード自体を省略
+    - なければ create（target_mime が Google Sheets なら CSV→Sheets に変換、
+      CSV_MIME なら変換せず CSV のまま作成）
+
+    existing は find_files_by_roles でまとめて検索したものを渡す。
+    作成・更新したファイルには appProperties.role を付ける（次回以降の検索用）。
+    （メディアアップロードはバッチ不可なので create/update は1件ずつ）
+    media は build_csv_media で作ったもの（CSV 全体が先頭から送られる）。
+    """
+    app_properties = {ROLE_PROPERTY: role, CSV_MD5_PROPERTY: csv_md5}
+
+    if existing and existing.get("appProperties", {}).get(CSV_MD5_PROPERTY) == csv_md5:
+        print(f"[INFO] {sheet_name}: unchanged (md5={csv_md5}), skip upload")
+        return existing
+
+    if existing:
+        # 既存SheetをCSV内容で上書き
+        updated = _execute_resumable(
+            drive_service.files().update(
+                fileId=existing["id"],
+                body={"appProperties": app_properties},
+                media_body=media,
+                fields="id,name,webViewLink",
+            )
+        )
+        return updated
+
+    metadata = {"name": sheet_name, "mimeType": target_mime, "appProperties": app_properties}
+    if folder_id:
+        metadata["parents"] = [folder_id]
+
+    created = _execute_resumable(
+        drive_service.files().create(
+            body=metadata,
+            media_body=media,
+            fields="id,name,webViewLink",
+        )
+    )
+    return created
+
+
+def copy_as_daily(
+    drive_service,
+    source_id: str,
+    csv_md5: str,
+    sheet_name: str,
+    role: str,
+    folder_id: Optional[str] = None,
+) -> dict:
+    """
+    source_id（アップロード済みの latest）をサーバ側でコピーして日付版を作る。
+    メディアを再送信しないので、同じ CSV を2回アップロードせずに済む。
+    （コピーは既存ファイルへの上書きができないので、日付版が未作成のときだけ使う）
+    """
+    metadata = {
+        "name": sheet_name,
+        "appProperties": {ROLE_PROPERTY: role, CSV_MD5_PROPERTY: csv_md5},
+    }
+    if folder_id:
+        metadata["parents"] = [folder_id]
+
+    copied = drive_service.files().copy(
+        fileId=source_id,
+        body=metadata,
+        fields="id,name,webViewLink",
+    ).execute()
+    return copied
+
+
+def _is_daily_copy(file: dict) -> bool:
+    role = file.get("appProperties", {}).get(ROLE_PROPERTY, "")
+    return bool(DAILY_NAME_RE.fullmatch(file.get("name", ""))) or role.startswith(DAILY_ROLE_PREFIX)
+
+
+def prune_old_daily(
+    drive_service,
+    folder_id: Optional[str],
+    keep_days: int = 30,
+    now: Optional[dt.datetime] = None,
+) -> int:
+    """
+    keep_days 日より前に更新された日付版（toggl_time_entries_YYYY-MM-DD）をゴミ箱へ移動する。
+    日付版が溜まると名前検索が遅くなるので、1回の files.list（ページング）で集めて
+    trashed=True の update をバッチでまとめて送る。
+
+    name contains は前方一致なので、結果は名前（YYYY-MM-DD まで完全一致）か
+    appProperties.role（toggl_daily_*）で日付版と確認できたものだけをゴミ箱へ移動する。
+    folder_id 未指定なら main() が作成する場所（マイドライブ直下）だけを対象にする。
+    戻り値: ゴミ箱へ移動した件数
+    """
+    now = now or dt.datetime.now()
+    cutoff = (now - dt.timedelta(days=keep_days)).astimezone(dt.timezone.utc)
+    q = (
+        f"name contains '{DAILY_NAME_PREFIX}' and name != '{LATEST_NAME}'"
+        f" and modifiedTime < '{cutoff.strftime('%Y-%m-%dT%H:%M:%S')}'"
+        f" and {_scope_query(folder_id or 'root')}"
+    )
+
+    file_ids = []
+    page_token = None
+    while True:
+        res = drive_service.files().list(
+            q=q,
+            spaces="drive",
+            fields="nextPageToken,files(id,name,appProperties)",
+            pageSize=DRIVE_BATCH_LIMIT,
+            pageToken=page_token,
+        ).execute()
+        file_ids.extend(f["id"] for f in res.get("files", []) if _is_daily_copy(f))
+        page_token = res.get("nextPageToken")
+        if not page_token:
+            break
+
+    trashed = 0
+
+    def _on_response(request_id, response, exception):
+        nonlocal trashed
+        if exception is not None:
+            # 1件失敗しても保存処理自体は成功しているので止めない
+            print(f"[WARN] Failed to trash old daily {request_id}: {exception}")
+            return
+        trashed += 1
+
+    for i in range(0, len(file_ids), DRIVE_BATCH_LIMIT):
+        batch = drive_service.new_batch_http_request(callback=_on_response)
+        for file_id in file_ids[i : i + DRIVE_BATCH_LIMIT]:
+            batch.add(
+                drive_service.files().update(fileId=file_id, body={"trashed": True}, fields="id"),
+                request_id=file_id,
+            )
+        batch.execute()
+    return trashed
+
+
+# ----------------------------
+# Main
+# ----------------------------
+def main():
+    # Required
+    toggl_api_token = require_env("TOGGL_API_TOKEN")
+    workspace_id = require_env("TOGGL_WORKSPACE_ID")
+    drive_token_json = require_env("GOOGLE_DRIVE_TOKEN")
+
+    # Optional
+    folder_id = os.environ.get("DRIVE_FOLDER_ID")  # My Drive 内フォルダ推奨（未指定なら直下）
+    write_daily = env_bool("WRITE_DAILY_COPY", True)
+    target_mime = resolve_target_mime()
+    retention_days = int(os.environ.get("DAILY_RETENTION_DAYS", "0"))
+
+    # 実行時刻は1回だけ取得し、取得期間・日付版の名前はここから作る
+    now = dt.datetime.now()
+    today = now.date()
+    start_date, end_date = resolve_date_range(today)
+
+    # 1) latest（固定名で上書き） 2) 日付版（任意）
+    # targets: {role: (表示用ラベル, ファイル名)}
+    latest_role = "toggl_latest"
+    daily_role = None
+    targets = {latest_role: ("latest", LATEST_NAME)}
+    if write_daily:
+        today_str = iso_date(today)
+        daily_role = f"{DAILY_ROLE_PREFIX}{today_str}"
+        targets[daily_role] = ("daily", f"{DAILY_NAME_PREFIX}{today_str}")
+
+    # Toggl の取得と Drive の準備（認証・既存ファイル検索）は独立なので並行して進める
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        print(f"[INFO] Fetching Toggl CSV: workspace={workspace_id}, range={start_date}..{end_date}")
+        csv_future = executor.submit(
+            fetch_toggl_csv,
+            workspace_id=workspace_id,
+            toggl_api_token=toggl_api_token,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+        print("[INFO] Building Drive client (OAuth)")
+        drive = get_drive_service_from_token_json(drive_token_json)
+
+        # latest / 日付版 の既存ファイル検索は1回のバッチで行う
+        existing_files = find_files_by_roles(
+            drive, {role: name for role, (_, name) in targets.items()}, folder_id
+        )
+
+        csv_file = csv_future.result()
+
+    csv_size, csv_md5 = measure_file(csv_file)
+    print(f"[INFO] CSV bytes: {csv_size}")
+
+    # 日付版が未作成なら、latest をアップロードした後にサーバ側コピーで作る（再アップロードなし）
+    # 既にある場合（同日の再実行）はコピーで上書きできないので latest と同様に upsert する
+    copy_daily = daily_role is not None and existing_files.get(daily_role) is None
+    upload_roles = [role for role in targets if not (copy_daily and role == daily_role)]
+
+    saved = {}
+
+    def _report(role: str, file: dict) -> None:
+        saved[role] = file
+        print(f"✅ {targets[role][0]} saved:", file["name"])
+        print("   link:", file.get("webViewLink"))
+
+    # アップロード同士は独立しているので並列に実行する（同じ service / media を共有する）
+    with csv_file, ThreadPoolExecutor(max_workers=len(upload_roles)) as executor:
+        media = build_csv_media(SharedReader(csv_file))
+        futures = {
+            executor.submit(
+                upsert_csv_as_google_sheet,
+                drive_service=drive,
+                media=media,
+                csv_md5=csv_md5,
+                sheet_name=targets[role][1],
+                role=role,
+                folder_id=folder_id,
+                existing=existing_files.get(role),
+                target_mime=target_mime,
+            ): role
+            for role in upload_roles
+        }
+        for fut in as_completed(futures):
+            _report(futures[fut], fut.result())
+
+    if copy_daily:
+        _report(
+            daily_role,
+            copy_as_daily(
+                drive_service=drive,
+                source_id=saved[latest_role]["id"],
+                csv_md5=csv_md5,
+                sheet_name=targets[daily_role][1],
+                role=daily_role,
+                folder_id=folder_id,
+            ),
+        )
+
+    save_file_ids({role: file["id"] for role, file in saved.items()}, folder_id)
+
+    # 古い日付版の整理（任意）
+    if retention_days > 0:
+        pruned = prune_old_daily(drive, folder_id, keep_days=retention_days, now=now)
+        print(f"[INFO] Trashed {pruned} daily copies older than {retention_days} days")